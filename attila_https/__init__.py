@@ -1,15 +1,45 @@
 """
 Requests-based Attila plugin for HTTPS path support.
+
+Connectors created with http2=True (or configured with "HTTP2 = true") use httpx instead of
+requests as the transport, so that requests to the same server share one multiplexed connection.
+This requires httpx with HTTP/2 support ("pip install httpx[http2]"); without it, requests is used
+anyway. Be aware that with httpx, errors are reported with httpx's exception types
+(httpx.HTTPStatusError, httpx.TransportError, etc.) rather than requests' (requests.HTTPError,
+requests.ConnectionError, etc.), and only failures to connect are retried.
 """
 
-from typing import Optional
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import asyncio
+import importlib.util
 import logging
 import os
+import shutil
+import ssl
+import threading
 import warnings
 
 from urllib.parse import urlparse
 
+import certifi
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# httpx only speaks HTTP/2 when the h2 package is installed.
+HTTP2_AVAILABLE = httpx is not None and importlib.util.find_spec('h2') is not None
+
+try:
+    import aiofiles
+    import aiohttp
+except ImportError:
+    aiofiles = aiohttp = None
 
 from attila.configurations import ConfigManager
 from attila.abc.files import FSConnector, Path, fs_connection
@@ -27,7 +57,7 @@ __url__ = 'https://scmgr.eams.ericsson.net/PythonLibs/attila_https'
 __description__ = 'Requests-based Attila plugin for HTTPS support'
 __license__ = 'MIT'
 __long_description__ = __doc__
-__install_requires__ = ['attila>=1.10.5', 'requests']
+__install_requires__ = ['attila>=1.10.5', 'certifi', 'requests']
 
 # This tells Attila how to find our plugins.
 __entry_points__ = {
@@ -43,6 +73,7 @@ __entry_points__ = {
 
 __all__ = [
     'DEFAULT_HTTPS_PORT',
+    'DEFAULT_POOL_MAXSIZE',
     'HTTPSConnector',
     'https_connection',
 ]
@@ -52,8 +83,151 @@ log = logging.getLogger(__name__)
 
 
 DEFAULT_HTTPS_PORT = 443
-HTTPS_URL_TEMPLATE = 'https://{server}{path}'
-HTTPS_URL_PORT_TEMPLATE = 'https://{server}:{port}{path}'
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+UPLOAD_CHUNK_SIZE = 1 << 20
+REQUEST_TIMEOUT = 30.0
+USER_AGENT = 'attila_https/%s' % __version__
+DEFAULT_POOL_MAXSIZE = 32
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+RETRY_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE'])
+EXISTS_CACHE_SIZE = 1024
+ASYNC_CONNECTION_LIMIT = 32
+ASYNC_CONNECTION_LIMIT_PER_HOST = 16
+
+
+class SSLContextAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter which hands a preconfigured SSL context to every connection pool it creates,
+    rather than letting each new connection build its own context and reload the CA bundle.
+    """
+
+    def __init__(self, ssl_context: ssl.SSLContext, *args, **kwargs):
+        self._ssl_context = ssl_context
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self._ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+
+class FileBlocks:
+    """
+    An iterable request body which reads a file in large blocks and reports the file's size, so
+    the body can be sent with a Content-Length header instead of chunked transfer encoding. The
+    file position is exposed through tell() and seek(), so that urllib3 can rewind the body when
+    it retries a request.
+    """
+
+    def __init__(self, file, size: int, block_size: int = UPLOAD_CHUNK_SIZE):
+        self._file = file
+        self._size = size
+        self._block_size = block_size
+
+    def __len__(self):
+        return self._size
+
+    def tell(self) -> int:
+        """Return the current position in the underlying file."""
+        return self._file.tell()
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        """Move to a new position in the underlying file."""
+        return self._file.seek(offset, whence)
+
+    def __iter__(self):
+        while True:
+            block = self._file.read(self._block_size)
+            if not block:
+                break
+            yield block
+
+
+class SharedSession:
+    """
+    A session shared by every open connection to the same server, along with a count of the
+    connections currently using it and a cache of which paths on the server are known to exist.
+    """
+
+    def __init__(self, session, uses_httpx: bool, cache_size: int = EXISTS_CACHE_SIZE):
+        self._session = session
+        self._uses_httpx = uses_httpx
+        self._users = 0
+
+        # Maps paths to whether they were last known to exist, in least recently used order.
+        self._exists_cache = OrderedDict()
+        self._exists_cache_size = cache_size
+        self._exists_cache_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """The underlying requests session or httpx client."""
+        return self._session
+
+    @property
+    def uses_httpx(self) -> bool:
+        """Whether the session is an httpx client rather than a requests session."""
+        return self._uses_httpx
+
+    @property
+    def users(self) -> int:
+        """The number of open connections currently using the session."""
+        return self._users
+
+    def acquire(self):
+        """Register another connection as using the session."""
+        self._users += 1
+
+    def release(self) -> int:
+        """
+        Register that a connection is done using the session.
+
+        :return: The number of connections still using the session.
+        """
+        assert self._users > 0
+        self._users -= 1
+        return self._users
+
+    def close(self):
+        """Close the underlying session."""
+        self._session.close()
+
+    def get_exists(self, path: str) -> Optional[bool]:
+        """
+        Look up whether a path is known to exist.
+
+        :param path: The path to look up.
+        :return: Whether the path exists, or None if that isn't known.
+        """
+        with self._exists_cache_lock:
+            exists = self._exists_cache.get(path)
+            if exists is not None:
+                self._exists_cache.move_to_end(path)
+            return exists
+
+    def set_exists(self, path: str, exists: bool):
+        """
+        Record whether a path exists, evicting the least recently used entry if the cache is full.
+
+        :param path: The path to record.
+        :param exists: Whether the path exists.
+        """
+        with self._exists_cache_lock:
+            self._exists_cache[path] = exists
+            self._exists_cache.move_to_end(path)
+            if len(self._exists_cache) > self._exists_cache_size:
+                self._exists_cache.popitem(last=False)
+
+    def invalidate(self, path: str = None):
+        """
+        Forget whether a path exists.
+
+        :param path: The path to forget, or None to forget all paths.
+        """
+        with self._exists_cache_lock:
+            if path is None:
+                self._exists_cache.clear()
+            else:
+                self._exists_cache.pop(path, None)
 
 
 class HTTPSConnector(FSConnector):
@@ -112,12 +286,13 @@ class HTTPSConnector(FSConnector):
         :return: An instance of this type.
         """
         verify_type(manager, ConfigManager)
-        assert isinstance(manager, ConfigManager)
 
         verify_type(section, str, non_empty=True)
 
         server = manager.load_option(section, 'Server', str)
         port = manager.load_option(section, 'Port', int, None)
+        pool_maxsize = manager.load_option(section, 'Pool Max Size', int, DEFAULT_POOL_MAXSIZE)
+        http2 = manager.load_option(section, 'HTTP2', bool, False)
         # credential = manager.load_section(section, credentials.Credential)
 
         if port is not None:
@@ -128,18 +303,41 @@ class HTTPSConnector(FSConnector):
             section,
             *args,
             server=server,
+            pool_maxsize=pool_maxsize,
+            http2=http2,
             # credential=credential,
             **kwargs
         )
 
-    def __init__(self, server, initial_cwd=None):
+    # Sessions shared by every open connection with the same (server, port, pool_maxsize, http2).
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+
+    def __init__(self, server, initial_cwd=None, pool_maxsize=DEFAULT_POOL_MAXSIZE, http2=False):
         verify_type(server, str, non_empty=True)
         server, port = strings.split_port(server, DEFAULT_HTTPS_PORT)
+        verify_type(pool_maxsize, int)
+        assert pool_maxsize > 0
+        verify_type(http2, bool)
+
+        if http2 and not HTTP2_AVAILABLE:
+            warnings.warn("HTTP/2 requires httpx with HTTP/2 support; falling back on requests.")
+            http2 = False
 
         super().__init__(https_connection, initial_cwd)
 
         self._server = server
         self._port = port
+        self._pool_maxsize = pool_maxsize
+        self._http2 = http2
+        self._ssl_context = None
+        self._http2_ssl_context = None
+
+        # The scheme, server, and port never change, so the URL prefix is computed only once.
+        if port == DEFAULT_HTTPS_PORT:
+            self._url_prefix = 'https://%s' % server
+        else:
+            self._url_prefix = 'https://%s:%s' % (server, port)
 
     def __repr__(self):
         server_string = None
@@ -149,6 +347,10 @@ class HTTPSConnector(FSConnector):
             else:
                 server_string = '%s:%s' % (self._server, self._port)
         args = [repr(server_string), repr(self.initial_cwd)]
+        if self._pool_maxsize != DEFAULT_POOL_MAXSIZE:
+            args.append('pool_maxsize=%r' % self._pool_maxsize)
+        if self._http2:
+            args.append('http2=True')
         return type(self).__name__ + '(' + ', '.join(args) + ')'
 
     @property
@@ -161,10 +363,110 @@ class HTTPSConnector(FSConnector):
         """The remote server's port."""
         return self._port
 
+    @property
+    def pool_maxsize(self) -> int:
+        """The maximum number of connections kept open to the remote server."""
+        return self._pool_maxsize
+
+    @property
+    def http2(self) -> bool:
+        """Whether connections use httpx over HTTP/2 instead of requests."""
+        return self._http2
+
+    @staticmethod
+    def _create_ssl_context() -> ssl.SSLContext:
+        context = ssl.create_default_context(cafile=certifi.where())
+        context.options |= ssl.OP_NO_COMPRESSION
+        return context
+
+    @property
+    def ssl_context(self) -> ssl.SSLContext:
+        """The SSL context shared by every HTTP/1.1 connection to the remote server."""
+        if self._ssl_context is None:
+            self._ssl_context = self._create_ssl_context()
+        return self._ssl_context
+
+    @property
+    def http2_ssl_context(self) -> ssl.SSLContext:
+        """
+        The SSL context shared by every HTTP/2 connection to the remote server. This is kept
+        separate from ssl_context because it also offers h2 during ALPN negotiation, which an
+        HTTP/1.1-only client must not do.
+        """
+        if self._http2_ssl_context is None:
+            context = self._create_ssl_context()
+            context.set_alpn_protocols(['h2', 'http/1.1'])
+            self._http2_ssl_context = context
+        return self._http2_ssl_context
+
+    @property
+    def url_prefix(self) -> str:
+        """The scheme, server, and port portion of every URL on this server."""
+        return self._url_prefix
+
     def connect(self):
         """Create a new connection and return it."""
         return super().connect()
 
+    def acquire_session(self) -> SharedSession:
+        """
+        Get the session shared by all open connections to the remote server with the same pool
+        size and transport, creating it if necessary. Each call must be paired with a call to
+        release_session().
+
+        :return: The shared session.
+        """
+        key = (self._server, self._port, self._pool_maxsize, self._http2)
+        with self._sessions_lock:
+            shared = self._sessions.get(key)
+            if shared is None:
+                shared = self._sessions[key] = SharedSession(*self._create_session())
+            shared.acquire()
+            return shared
+
+    def release_session(self):
+        """Release the shared session, closing it once no open connection is using it."""
+        key = (self._server, self._port, self._pool_maxsize, self._http2)
+        with self._sessions_lock:
+            shared = self._sessions[key]
+            if shared.release():
+                return
+            del self._sessions[key]
+        shared.close()
+
+    def _create_session(self):
+        # With httpx, requests are additionally multiplexed over the connection using HTTP/2.
+        if not self._http2:
+            session = requests.Session()
+            # Once retries on an error status run out, the last response is handed back as usual
+            # rather than raised as a RetryError, so the callers' status checks still apply. The
+            # server's Retry-After header is ignored, since it could stall a call for hours; the
+            # backoff factor alone decides how long to wait between attempts.
+            retry = Retry(total=3, connect=3, read=3, backoff_factor=0.25,
+                          status_forcelist=RETRY_STATUS_CODES, allowed_methods=RETRY_METHODS,
+                          raise_on_status=False, respect_retry_after_header=False)
+            adapter = SSLContextAdapter(self.ssl_context, pool_connections=4,
+                                        pool_maxsize=self._pool_maxsize, max_retries=retry)
+            session.mount('https://', adapter)
+            session.headers.update({
+                'Connection': 'keep-alive',
+                'Accept-Encoding': 'gzip, deflate',
+                'User-Agent': USER_AGENT,
+            })
+            return session, False
+        else:
+            limits = httpx.Limits(max_connections=self._pool_maxsize,
+                                  max_keepalive_connections=self._pool_maxsize)
+            transport = httpx.HTTPTransport(verify=self.http2_ssl_context, http2=True,
+                                            limits=limits, retries=3)
+            # HTTP/2 forbids the Connection header; its connections are persistent regardless.
+            headers = {
+                'Accept-Encoding': 'gzip, deflate',
+                'User-Agent': USER_AGENT,
+            }
+            return httpx.Client(transport=transport, headers=headers, follow_redirects=True,
+                                timeout=REQUEST_TIMEOUT), True
+
 
 # noinspection PyPep8Naming
 class https_connection(fs_connection):
@@ -188,6 +490,9 @@ class https_connection(fs_connection):
         """
         assert isinstance(connector, HTTPSConnector)
         super().__init__(connector)
+        self._shared = None
+        self._session = None
+        self._uses_httpx = False
 
     def name(self, path) -> str:
         """
@@ -196,9 +501,8 @@ class https_connection(fs_connection):
         :param path: The path to operate on.
         :return: The name.
         """
-        path = self.check_path(path)
-        raw_path = urlparse(path)[2]  # Remove the query string, etc.
-        return os.path.basename(raw_path)
+        raw_path = self._get_raw_path(self.check_path(path))
+        return raw_path.rpartition('/')[2]
 
     def dir(self, path) -> Optional[Path]:
         """
@@ -207,20 +511,35 @@ class https_connection(fs_connection):
         :param path: The path to operate on.
         :return: The parent directory's path, or None.
         """
-        path = self.check_path(path)
-        raw_path = urlparse(path)[2]  # Remove the query string, etc.
-        dir_path = os.path.dirname(raw_path)
+        raw_path = self._get_raw_path(self.check_path(path))
+        head, sep, _ = raw_path.rpartition('/')
+        # Trailing slashes are dropped from the parent, unless that would leave nothing at all.
+        dir_path = head.rstrip('/') or head + sep
         if dir_path == raw_path:
             return None
         else:
             return Path(dir_path, self)
 
+    @staticmethod
+    def _get_raw_path(path: str) -> str:
+        # Remove the query string and fragment, plus any ;parameters on the last path segment,
+        # just as urlparse() does.
+        path = path.partition('?')[0].partition('#')[0]
+        head, sep, tail = path.rpartition('/')
+        return head + sep + tail.partition(';')[0]
+
     def open(self):
         """Open the HTTPS connection."""
         assert not self.is_open
 
         cwd = self.getcwd()
 
+        # All open connections to the same server share a session, so the pooled TCP/TLS
+        # connections stay alive between requests instead of paying for a new handshake every time.
+        self._shared = self._connector.acquire_session()
+        self._session = self._shared.session
+        self._uses_httpx = self._shared.uses_httpx
+
         super().open()
         if cwd is None:
             # This forces the CWD to be refreshed.
@@ -233,6 +552,10 @@ class https_connection(fs_connection):
         """Close the HTTPS connection"""
         if not self._is_open:
             warnings.warn("Double-closing HTTPS connection.")
+        if self._session is not None:
+            self._connector.release_session()
+            self._shared = None
+            self._session = None
         self._is_open = False
 
     def chdir(self, path):
@@ -240,27 +563,106 @@ class https_connection(fs_connection):
         super().chdir(path)
 
     def _get_url(self, path: str) -> str:
-        if self._connector.port == DEFAULT_HTTPS_PORT:
-            return HTTPS_URL_TEMPLATE.format(
-                server=self._connector.server,
-                path=str(path)
-            )
-        else:
-            return HTTPS_URL_PORT_TEMPLATE.format(
-                server=self._connector.server,
-                port=self._connector.port,
-                path=str(path)
-            )
+        # Callers have already normalized the path to a string with check_path().
+        return self._connector.url_prefix + path
 
     def _download(self, remote_path, local_path):
         assert self.is_open
         remote_path = self.check_path(remote_path)
         assert isinstance(local_path, str)
 
-        response = requests.get(self._get_url(remote_path))
-        response.raise_for_status()
-        with open(local_path, 'wb') as local_copy:
-            local_copy.writelines(response.iter_content())
+        url = self._get_url(remote_path)
+
+        # Stream the body straight to disk in large blocks rather than buffering it all in memory.
+        if self._uses_httpx:
+            with self._session.stream('GET', url) as response:
+                response.raise_for_status()
+                with open(local_path, 'wb') as local_copy:
+                    for chunk in response.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        local_copy.write(chunk)
+        else:
+            with self._session.get(url, stream=True, timeout=REQUEST_TIMEOUT) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                with open(local_path, 'wb') as local_copy:
+                    shutil.copyfileobj(response.raw, local_copy, DOWNLOAD_CHUNK_SIZE)
+
+    async def download_many(self, pairs: List[Tuple[str, str]]):
+        """
+        Download several files concurrently.
+
+        If the connection uses requests and aiohttp and aiofiles are installed, the downloads share
+        a single aiohttp session for the duration of the call. That session sends the same
+        User-Agent as this connection, but does not apply its retry policy. Otherwise, each
+        download runs on this connection in a worker thread.
+
+        If any download fails, its error is raised with the same exception types that _download()
+        would raise for this connection's transport: requests.HTTPError, requests.ConnectionError,
+        or requests.Timeout with requests, or httpx's exceptions with httpx. Errors from aiohttp
+        are translated to the corresponding requests exceptions. With aiohttp, the other
+        downloads are first cancelled and any local files they had partially written are removed.
+
+        :param pairs: A list of (remote_path, local_path) pairs.
+        """
+        assert self.is_open
+
+        jobs = []
+        for remote_path, local_path in pairs:
+            remote_path = self.check_path(remote_path)
+            assert isinstance(local_path, str)
+            jobs.append((remote_path, local_path))
+
+        # The httpx client already multiplexes concurrent requests over HTTP/2, and going through
+        # it keeps errors in httpx's types, so aiohttp is only used in place of requests.
+        if aiohttp is None or self._uses_httpx:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*[loop.run_in_executor(None, self._download, remote, local)
+                                   for remote, local in jobs])
+            return
+
+        # An aiohttp session is bound to the event loop it was created in, so it can't outlive this
+        # call; it is still shared by every download in the batch.
+        connector = aiohttp.TCPConnector(limit=ASYNC_CONNECTION_LIMIT,
+                                         limit_per_host=ASYNC_CONNECTION_LIMIT_PER_HOST,
+                                         ssl=self._connector.ssl_context)
+        headers = {'User-Agent': USER_AGENT}
+        async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
+            tasks = [asyncio.ensure_future(self._fetch_one(session, self._get_url(remote_path),
+                                                           local_path))
+                     for remote_path, local_path in jobs]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # Wind down the other downloads before the session closes underneath them.
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+
+    @staticmethod
+    async def _fetch_one(session, url, local_path):
+        written = False
+        try:
+            async with session.get(url) as response:
+                response.raise_for_status()
+                async with aiofiles.open(local_path, 'wb') as local_copy:
+                    written = True
+                    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        await local_copy.write(chunk)
+        except BaseException as error:
+            # Don't leave a truncated copy behind.
+            if written:
+                os.remove(local_path)
+
+            # Report failures the same way the requests session would.
+            if isinstance(error, aiohttp.ClientResponseError):
+                raise requests.HTTPError('%s Error: %s for url: %s' %
+                                         (error.status, error.message, url)) from error
+            if isinstance(error, asyncio.TimeoutError):
+                raise requests.Timeout('Timed out downloading %s' % url) from error
+            if isinstance(error, aiohttp.ClientError):
+                raise requests.ConnectionError('%s for url: %s' % (error, url)) from error
+            raise
 
     def _upload(self, local_path, remote_path):
         assert self.is_open
@@ -271,11 +673,33 @@ class https_connection(fs_connection):
         assert isinstance(local_path, str)
 
         remote_path = self.check_path(remote_path)
+        url = self._get_url(remote_path)
 
+        size = os.path.getsize(local_path)
         with open(local_path, 'rb') as local_copy:
-            response = requests.put(remote_path, local_copy)
+            body, headers = self._prepare_upload(local_copy, size)
+            if self._uses_httpx:
+                response = self._session.put(url, content=body, headers=headers)
+            else:
+                response = self._session.put(url, data=body, headers=headers,
+                                             timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
 
+        self._shared.set_exists(remote_path, True)
+
+    @staticmethod
+    def _prepare_upload(file, size):
+        # Returns the body and headers to PUT the contents of an open file. Both requests and
+        # httpx work out the Content-Length from the FileBlocks body on their own.
+        headers = {
+            'Content-Type': 'application/octet-stream',
+            'Accept-Encoding': 'identity',
+        }
+        if not size:
+            # An empty iterable body would be sent with chunked transfer encoding.
+            return b'', headers
+        return FileBlocks(file, size), headers
+
     def open_file(self, path, mode='r', buffering=-1, encoding=None, errors=None, newline=None, closefd=True,
                   opener=None):
         """
@@ -353,8 +777,9 @@ class https_connection(fs_connection):
         if self.is_dir(path):
             raise OperationNotSupportedError()
         else:
-            response = requests.delete(self._get_url(path))
+            response = self._session.delete(self._get_url(path), timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
+            self._shared.set_exists(path, False)
 
     def make_dir(self, path, overwrite=False, clear=False, fill=True, check_only=None):
         """
@@ -394,13 +819,59 @@ class https_connection(fs_connection):
 
     def is_file(self, path):
         """
-        Determine if the path refers to an existing file.
+        Determine if the path refers to an existing file. Definite answers from the server are
+        cached, and the cache is shared by every open connection to the server; it is updated when
+        a file is uploaded or removed through any of them. Use invalidate_cache() to pick up
+        changes made by anyone else.
 
         :param path: The path to operate on.
         :return: Whether the path is a file.
         """
+        assert self.is_open
         path = self.check_path(path)
-        return requests.get(self._get_url(path)).ok
+
+        exists = self._shared.get_exists(path)
+        if exists is not None:
+            return exists
+
+        status_code = self._get_status_code(self._get_url(path))
+        if 200 <= status_code < 300:
+            exists = True
+        elif status_code in (404, 410):
+            exists = False
+        else:
+            # Anything else (an authorization failure, rate limiting, or a server error that
+            # outlasted the retries) says nothing definite about the file, so it isn't cached.
+            return status_code < 400
+        self._shared.set_exists(path, exists)
+        return exists
+
+    def invalidate_cache(self, path=None):
+        """
+        Forget the cached existence of a file, so the next check goes back to the server.
+
+        :param path: The path to forget, or None to forget all paths.
+        """
+        if self._shared is None:
+            return  # Nothing is cached while the connection is closed.
+        if path is not None:
+            path = self.check_path(path)
+        self._shared.invalidate(path)
+
+    def _get_status_code(self, url):
+        # A HEAD request answers the question without transferring the body. Some servers refuse
+        # HEAD, in which case we fall back on a streamed GET and close it without reading the body.
+        if self._uses_httpx:
+            response = self._session.head(url)
+            if response.status_code in (405, 501):
+                with self._session.stream('GET', url) as response:
+                    return response.status_code
+        else:
+            response = self._session.head(url, allow_redirects=True, timeout=REQUEST_TIMEOUT)
+            if response.status_code in (405, 501):
+                with self._session.get(url, stream=True, timeout=REQUEST_TIMEOUT) as response:
+                    return response.status_code
+        return response.status_code
 
     def join(self, *path_elements):
         """
@@ -417,10 +888,11 @@ class https_connection(fs_connection):
             #       https://mail.python.org/pipermail/new-bugs-announce/2009-January.txt
             # To avoid this confusing misrepresentation of errors, I have broken this section out
             # into multiple statements so TypeErrors get the opportunity to propagate correctly.
-            starting_slash = path_elements and str(path_elements[0]).startswith('/')
-            path_elements = tuple(self.check_path(element).strip('/\\') for element in path_elements)
+            starting_slash = str(path_elements[0]).startswith('/')
+            parts = [self.check_path(element).strip('/\\') for element in path_elements]
+            joined = '/'.join(parts)
             if starting_slash:
-                path_elements = ('',) + path_elements
-            return Path('/'.join(path_elements), connection=self)
+                joined = '/' + joined
+            return Path(joined, connection=self)
         else:
             return Path(connection=self)
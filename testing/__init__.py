@@ -1,8 +1,43 @@
+import asyncio
+import http.server
+import io
+import os
+import tempfile
+import threading
+import time
 import unittest
 
+from unittest import mock
+from urllib.parse import urlparse
+
 from attila.configurations import get_attila_config_manager
 from attila.fs import Path
 
+import requests
+from requests.adapters import HTTPAdapter
+
+import attila_https
+from attila_https import FileBlocks, HTTPSConnector, SharedSession, https_connection
+
+
+def start_server(test_case, handler_class):
+    """Serve plain HTTP on a local port for the rest of the test, and return the port number."""
+    server = http.server.HTTPServer(('127.0.0.1', 0), handler_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test_case.addCleanup(server.server_close)
+    test_case.addCleanup(server.shutdown)
+    return server.server_port
+
+
+def open_connection(test_case, server, mock_session=False):
+    """Open a connection to the server for the rest of the test, optionally faking its session."""
+    connection = HTTPSConnector(server).connect()
+    connection.open()
+    test_case.addCleanup(connection.close)
+    if mock_session:
+        connection._session = mock.Mock()
+    return connection
+
 
 class TestPlugin(unittest.TestCase):
 
@@ -52,3 +87,250 @@ class TestPlugin(unittest.TestCase):
             self.assertFalse(results_file.exists)
 
             print("Done.")
+
+    def test_name_and_dir(self):
+        connection = HTTPSConnector('example.com').connect()
+        paths = ['/a', '/', 'a', '', '/a/b/', '/a//b', '/a/b?x=/y', '?q=1', '/a/b?', 'a//',
+                 '/a/b#frag', '/a/b?x#y', '/a/b#y?x', '#frag', '/a/b;x', '/a;x/b', '/a/b/;x',
+                 '/a/b;x?y=1']
+        for path in paths:
+            raw_path = urlparse(path)[2]
+            self.assertEqual(connection.name(path), os.path.basename(raw_path))
+            dir_path = os.path.dirname(raw_path)
+            if dir_path == raw_path:
+                self.assertIsNone(connection.dir(path))
+            else:
+                self.assertEqual(str(connection.dir(path)), dir_path)
+
+
+class TestUploads(unittest.TestCase):
+
+    def test_file_blocks(self):
+        file = io.BytesIO(b'0123456789')
+        body = FileBlocks(file, 10, block_size=4)
+        self.assertEqual(len(body), 10)
+        self.assertEqual(list(body), [b'0123', b'4567', b'89'])
+
+        # Rewinding the body, as urllib3 does on a retry, replays the whole file.
+        body.seek(0)
+        self.assertEqual(body.tell(), 0)
+        self.assertEqual(b''.join(body), b'0123456789')
+
+    def test_prepare_upload(self):
+        connection = HTTPSConnector('example.com').connect()
+        body, headers = connection._prepare_upload(io.BytesIO(b'0123456789'), 10)
+        request = requests.Request('PUT', 'https://example.com/x', data=body,
+                                   headers=headers).prepare()
+        self.assertEqual(request.headers['Content-Length'], '10')
+        self.assertNotIn('Transfer-Encoding', request.headers)
+
+    def test_prepare_empty_upload(self):
+        connection = HTTPSConnector('example.com').connect()
+        body, headers = connection._prepare_upload(io.BytesIO(), 0)
+        request = requests.Request('PUT', 'https://example.com/x', data=body,
+                                   headers=headers).prepare()
+        self.assertEqual(request.headers['Content-Length'], '0')
+        self.assertNotIn('Transfer-Encoding', request.headers)
+
+    @unittest.skipIf(attila_https.httpx is None, "httpx is not installed.")
+    def test_prepare_httpx_upload(self):
+        connection = HTTPSConnector('example.com').connect()
+        body, headers = connection._prepare_upload(io.BytesIO(b'0123456789'), 10)
+        request = attila_https.httpx.Request('PUT', 'https://example.com/x', content=body,
+                                             headers=headers)
+        self.assertEqual(request.headers['Content-Length'], '10')
+        self.assertNotIn('Transfer-Encoding', request.headers)
+
+
+class TestSharedSessions(unittest.TestCase):
+
+    def test_reference_counting(self):
+        connector = HTTPSConnector('shared.example.com')
+        first = connector.acquire_session()
+        second = HTTPSConnector('shared.example.com').acquire_session()
+        self.assertIs(first, second)
+        self.assertEqual(first.users, 2)
+
+        with mock.patch.object(first.session, 'close') as close:
+            connector.release_session()
+            self.assertEqual(first.users, 1)
+            close.assert_not_called()
+
+            connector.release_session()
+            self.assertEqual(first.users, 0)
+            close.assert_called_once_with()
+
+        third = connector.acquire_session()
+        self.assertIsNot(third, first)
+        connector.release_session()
+
+    def test_pool_size_is_not_shared(self):
+        small = HTTPSConnector('pooled.example.com', pool_maxsize=1)
+        large = HTTPSConnector('pooled.example.com', pool_maxsize=64)
+        try:
+            self.assertIsNot(small.acquire_session(), large.acquire_session())
+        finally:
+            small.release_session()
+            large.release_session()
+
+    def test_requests_is_the_default_transport(self):
+        connector = HTTPSConnector('transport.example.com')
+        shared = connector.acquire_session()
+        try:
+            self.assertFalse(shared.uses_httpx)
+            self.assertIsInstance(shared.session, requests.Session)
+        finally:
+            connector.release_session()
+
+    @unittest.skipUnless(attila_https.HTTP2_AVAILABLE, "httpx with HTTP/2 is not installed.")
+    def test_http2_is_opt_in(self):
+        default = HTTPSConnector('transport.example.com')
+        http2 = HTTPSConnector('transport.example.com', http2=True)
+        try:
+            self.assertFalse(default.acquire_session().uses_httpx)
+            self.assertTrue(http2.acquire_session().uses_httpx)
+        finally:
+            default.release_session()
+            http2.release_session()
+
+    def test_retry_after_is_ignored(self):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                self.send_response(503)
+                self.send_header('Retry-After', '3600')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        port = start_server(self, Handler)
+
+        connector = HTTPSConnector('retry.example.com')
+        shared = connector.acquire_session()
+        self.addCleanup(connector.release_session)
+        retry = shared.session.get_adapter('https://retry.example.com/').max_retries
+
+        # The test server speaks plain HTTP, so the connector's retry policy is mounted on a
+        # separate session to exercise it.
+        session = requests.Session()
+        session.mount('http://', HTTPAdapter(max_retries=retry))
+        start = time.monotonic()
+        response = session.head('http://127.0.0.1:%d/x' % port)
+        self.assertEqual(response.status_code, 503)
+        self.assertLess(time.monotonic() - start, 10)
+
+
+class TestExistsCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        shared = SharedSession(mock.Mock(), False, cache_size=2)
+        shared.set_exists('/a', True)
+        shared.set_exists('/b', False)
+        self.assertTrue(shared.get_exists('/a'))  # Makes '/b' the least recently used.
+        shared.set_exists('/c', True)
+        self.assertTrue(shared.get_exists('/a'))
+        self.assertIsNone(shared.get_exists('/b'))
+        self.assertTrue(shared.get_exists('/c'))
+
+    def test_invalidate(self):
+        shared = SharedSession(mock.Mock(), False)
+        shared.set_exists('/a', True)
+        shared.set_exists('/b', False)
+        shared.invalidate('/a')
+        self.assertIsNone(shared.get_exists('/a'))
+        self.assertFalse(shared.get_exists('/b'))
+        shared.invalidate()
+        self.assertIsNone(shared.get_exists('/b'))
+
+    def test_upload_and_remove_update_cache(self):
+        connection = open_connection(self, 'cache.example.com', mock_session=True)
+        other = open_connection(self, 'cache.example.com', mock_session=True)
+
+        with tempfile.NamedTemporaryFile(delete=False) as file:
+            file.write(b'data')
+        self.addCleanup(os.remove, file.name)
+
+        connection._upload(file.name, '/file')
+        self.assertTrue(connection.is_file('/file'))
+        self.assertTrue(other.is_file('/file'))
+
+        connection.remove('/file')
+        self.assertFalse(connection.is_file('/file'))
+        self.assertFalse(other.is_file('/file'))
+
+        connection._session.head.assert_not_called()
+        other._session.head.assert_not_called()
+
+        connection.invalidate_cache('/file')
+        connection._session.head.return_value = mock.Mock(status_code=200)
+        self.assertTrue(connection.is_file('/file'))
+        self.assertEqual(connection._session.head.call_count, 1)
+
+    def test_only_definite_answers_are_cached(self):
+        connection = open_connection(self, 'cache.example.com', mock_session=True)
+
+        connection._session.head.return_value = mock.Mock(status_code=503)
+        self.assertFalse(connection.is_file('/flaky'))
+        self.assertFalse(connection.is_file('/flaky'))
+        self.assertEqual(connection._session.head.call_count, 2)
+
+        connection._session.head.return_value = mock.Mock(status_code=404)
+        self.assertFalse(connection.is_file('/missing'))
+        self.assertFalse(connection.is_file('/missing'))
+        self.assertEqual(connection._session.head.call_count, 3)
+
+
+class TestDownloadMany(unittest.TestCase):
+
+    def test_executor_fallback(self):
+        connection = open_connection(self, 'batch.example.com')
+        with mock.patch.object(attila_https, 'aiohttp', None), \
+                mock.patch.object(connection, '_download') as download:
+            asyncio.run(connection.download_many([('/a', 'a.txt'), ('/b', 'b.txt')]))
+        self.assertCountEqual(download.call_args_list,
+                              [mock.call('/a', 'a.txt'), mock.call('/b', 'b.txt')])
+
+    @unittest.skipIf(attila_https.aiohttp is None, "aiohttp is not installed.")
+    def test_failure_cancels_other_downloads(self):
+        connection = open_connection(self, 'batch.example.com')
+        cancelled = []
+
+        async def fetch_one(session, url, local_path):
+            if url.endswith('/bad'):
+                raise ValueError(url)
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(local_path)
+                raise
+
+        with mock.patch.object(connection, '_fetch_one', fetch_one):
+            with self.assertRaises(ValueError):
+                asyncio.run(connection.download_many([('/slow', 'slow.txt'), ('/bad', 'bad.txt')]))
+        self.assertEqual(cancelled, ['slow.txt'])
+
+    @unittest.skipIf(attila_https.aiohttp is None, "aiohttp is not installed.")
+    def test_aiohttp_errors_use_requests_types(self):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        port = start_server(self, Handler)
+        local_path = os.path.join(tempfile.mkdtemp(), 'missing.txt')
+
+        async def fetch(url):
+            async with attila_https.aiohttp.ClientSession() as session:
+                await https_connection._fetch_one(session, url, local_path)
+
+        with self.assertRaises(requests.HTTPError):
+            asyncio.run(fetch('http://127.0.0.1:%d/missing' % port))
+        self.assertFalse(os.path.exists(local_path))
+
+        with self.assertRaises(requests.ConnectionError):
+            asyncio.run(fetch('http://127.0.0.1:1/unreachable'))